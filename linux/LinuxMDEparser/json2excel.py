@@ -1,21 +1,220 @@
 import json
 import csv
+import io
+import mmap
+import os
+from functools import lru_cache
+from itertools import chain, islice
+
+READ_BUFFER_SIZE = 1 << 20
+WRITE_BUFFER_SIZE = 1 << 20
+LARGE_FILE_SIZE = 64 << 20
+SMALL_FILE_SIZE = 10 << 20
+ROWS_PER_CHUNK = 4096
+SAMPLE_ROWS = 100
+PANDAS_MAX_ROWS = 500000
+
+# characters that force proper csv quoting
+SPECIAL_CHARS = (',', '"', '\n', '\r')
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+def _loads(raw):
+    if orjson is not None:
+        return orjson.loads(raw)
+    if simdjson is not None:
+        # recursive=True materializes plain dicts/lists so the csv
+        # writer below works unchanged
+        return simdjson.Parser().parse(raw, True)
+    if not isinstance(raw, (bytes, str)):
+        # stdlib json cannot parse straight from an mmap/memoryview
+        raw = bytes(raw)
+    return json.loads(raw)
+
+@lru_cache(maxsize=4)
+def _load(logfile, mtime):
+    # memoized per (file, mtime) so converting the same log twice in
+    # one run only pays for the parse once; mtime in the key makes
+    # invalidation automatic
+    if os.path.getsize(logfile) > LARGE_FILE_SIZE:
+        # big files are parsed straight out of the page cache via
+        # mmap, avoiding an extra in-RAM copy of the whole file
+        with open(logfile, 'rb') as json_file:
+            with mmap.mmap(json_file.fileno(), 0, access = mmap.ACCESS_READ) as mm:
+                return _loads(memoryview(mm))
+    with open(logfile, 'rb', buffering = READ_BUFFER_SIZE) as json_file:
+        return _loads(json_file.read())
+
+def _detect_dictkey(json_file):
+    # first map_key event is the top level key holding the event array
+    for prefix, event, value in ijson.parse(json_file):
+        if event == 'map_key':
+            return value
+    return None
+
+def _cell(value):
+    # lists/dicts become compact JSON text instead of Python repr;
+    # scalars pass through untouched
+    if isinstance(value, (list, dict)):
+        if orjson is not None:
+            return orjson.dumps(value).decode()
+        return json.dumps(value)
+    return value
+
+def _field(value):
+    # csv-style escaping for the odd cell that needs it; the sample
+    # only picks the likely-plain fast path, it cannot rule out a
+    # comma or quote showing up in a later row
+    value = str(value)
+    if any(c in value for c in SPECIAL_CHARS):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+def _has_containers(keys, sample):
+    for row in sample:
+        for key in keys:
+            if isinstance(row.get(key), (list, dict)):
+                return True
+    return False
+
+def _is_plain(keys, sample):
+    for row in sample:
+        for key in keys:
+            value = str(row.get(key, ''))
+            if any(c in value for c in SPECIAL_CHARS):
+                return False
+    return True
 
 class Json2excel:
-    def __init__(self, logfile, filename):
+    def __init__(self, logfile, filename, dictionary_key=None):
         self.logfile = logfile
         self.filename = filename
-    
+        # when None the top level key is inferred from the file itself
+        self.dictionary_key = dictionary_key
+
     def json2excel(self):
         try:
-            with open (self.logfile) as json_file:
-                log_dict = json.load(json_file)
-                dictkey = next(iter(log_dict))
-                keys = log_dict[dictkey][0].keys()
-                with open(self.filename, 'w', newline='', encoding = 'utf-8') as csvfile:
-                    writer = csv.DictWriter(csvfile, fieldnames = keys)
-                    writer.writeheader()
-                    writer.writerows(log_dict[dictkey])
-                    print(f'{self.filename} created')
+            if ijson is not None:
+                self._convert_streaming()
+            else:
+                self._convert_in_memory()
+            print(f'{self.filename} created')
+        except Exception as e:
+            print(f'Someting went wrong:{e}')
+
+    def convert_jsonl(self):
+        # newline-delimited input: one JSON object per line, one csv
+        # row out per line, constant memory end to end
+        try:
+            with open(self.logfile, 'rb', buffering = READ_BUFFER_SIZE) as json_file:
+                rows = (_loads(line) for line in json_file if line.strip())
+                first = next(rows)
+                self._write_csv(first.keys(), chain([first], rows))
+            print(f'{self.filename} created')
         except Exception as e:
-            print(f'Someting went wrong:{e}')
\ No newline at end of file
+            print(f'Someting went wrong:{e}')
+
+    def _convert_streaming(self):
+        # incremental parse keeps memory flat no matter how big the log is
+        with open(self.logfile, 'rb') as json_file:
+            dictkey = self.dictionary_key
+            if dictkey is None:
+                dictkey = _detect_dictkey(json_file)
+                json_file.seek(0)
+            items = ijson.items(json_file, f'{dictkey}.item')
+            first = next(items)
+            self._write_csv(first.keys(), chain([first], items))
+
+    def _convert_in_memory(self):
+        log_dict = _load(self.logfile, os.path.getmtime(self.logfile))
+        dictkey = self.dictionary_key or next(iter(log_dict))
+        data = log_dict[dictkey]
+        if pandas is not None and data and len(data) < PANDAS_MAX_ROWS:
+            # the C-backed pandas writer beats the pure csv path when
+            # the rows comfortably fit in memory; rows are shaped
+            # exactly like the csv writers below - first-row keys,
+            # missing fields as empty cells, containers through _cell -
+            # so pandas never sees NaN and never coerces int columns
+            # to float or grows extra columns from stray keys
+            keys = tuple(data[0].keys())
+            rows = [{key: _cell(row.get(key, '')) for key in keys} for row in data]
+            pandas.DataFrame(rows, columns = list(keys)).to_csv(self.filename, index = False, lineterminator = '\n')
+        else:
+            self._write_csv(data[0].keys(), data)
+
+    def _write_csv(self, keys, rows):
+        keys = tuple(keys)
+        rows = iter(rows)
+        # sample a few rows; if no value needs quoting the csv module
+        # can be skipped entirely and rows joined by hand
+        sample = list(islice(rows, SAMPLE_ROWS))
+        rows = chain(sample, rows)
+        if sample and _has_containers(keys, sample):
+            rows = ({key: _cell(row.get(key, '')) for key in keys} for row in rows)
+        if sample and _is_plain(keys, sample):
+            self._write_plain(keys, rows)
+        else:
+            self._write_quoted(keys, rows)
+
+    def _write_plain(self, keys, rows):
+        buf = bytearray()
+        buf += (','.join(map(_field, keys)) + '\n').encode('utf-8')
+        with open(self.filename, 'wb') as out:
+            for row in rows:
+                # .get with an empty default: older agent versions can
+                # drop fields from any row, not just the sampled ones
+                buf += (','.join(_field(row.get(key, '')) for key in keys) + '\n').encode('utf-8')
+                if len(buf) >= WRITE_BUFFER_SIZE:
+                    out.write(buf)
+                    buf.clear()
+            if buf:
+                out.write(buf)
+
+    def _write_quoted(self, keys, rows):
+        # .get keeps rows with dropped fields writable as empty cells,
+        # matching DictWriter's restval behaviour
+        getter = lambda row: [row.get(key, '') for key in keys]
+        if os.path.getsize(self.logfile) < SMALL_FILE_SIZE:
+            # small logs: build the whole CSV in memory and write it
+            # out with a single syscall
+            buf = io.BytesIO()
+            text = io.TextIOWrapper(buf, encoding = 'utf-8', newline = '', write_through = True)
+            writer = csv.writer(text)
+            writer.writerow(keys)
+            writer.writerows(map(getter, rows))
+            text.flush()
+            with open(self.filename, 'wb') as out:
+                out.write(buf.getvalue())
+            return
+        # 1 MiB buffer and chunked writerows keep the syscall count low
+        # on big logs while rows keep streaming in
+        raw = open(self.filename, 'wb')
+        buffered = io.BufferedWriter(raw, buffer_size = WRITE_BUFFER_SIZE)
+        with io.TextIOWrapper(buffered, encoding = 'utf-8', newline = '') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(keys)
+            while True:
+                chunk = list(islice(rows, ROWS_PER_CHUNK))
+                if not chunk:
+                    break
+                # map + writerows keeps the row loop mostly in C
+                # instead of bouncing through a generator frame
+                writer.writerows(map(getter, chunk))
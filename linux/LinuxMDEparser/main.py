@@ -1,6 +1,5 @@
 import sys
 import argparse
-import json2excel
 
 # Main Menu
 parser = argparse.ArgumentParser(prog='LinuxMDEparser.exe', usage='%(prog)s [command] [--option]')
@@ -9,31 +8,63 @@ subparsers.required=True
 
 # wdavhistory sub menu
 wdavhistory = subparsers.add_parser('wdavhistory', help='File can be found on var\opt\microsoft\mdatp\wdavhistory from MDE logs folder')
-wdavhistory.add_argument('--convert', dest='convert', help='Converts wdavhistory to wdavhistory.csv', action='store_true')
+wdavhistory.add_argument('--convert', dest='convert', help=argparse.SUPPRESS, action='store_true')
+wdavhistory.add_argument('--jsonl', dest='jsonl', help='Treat the log as newline-delimited JSON (one object per line)', action='store_true')
 
 # real-time-protection.json sub menu
 wdavhistory = subparsers.add_parser('real-time-protection', help='Troubleshoot performance issues for Microsoft Defender')
-wdavhistory.add_argument('--convert', dest='convert', help='Converts real_time_protection.json to real_time_protection.csv', action='store_true')
+wdavhistory.add_argument('--convert', dest='convert', help=argparse.SUPPRESS, action='store_true')
+wdavhistory.add_argument('--jsonl', dest='jsonl', help='Treat the log as newline-delimited JSON (one object per line)', action='store_true')
 
-if len(sys.argv) <= 1:
-    sys.argv.append('--help')
+# convert-all sub menu
+wdavhistory = subparsers.add_parser('convert-all', help='Converts every known log file in one run')
 
-args = parser.parse_args()
+# log filename and csv output per command, looked up in O(1) instead
+# of walking an if/elif chain
+DISPATCH = {
+    'wdavhistory': ('wdavhistory', 'wdavhistory.csv'),
+    'real-time-protection': ('real_time_protection.json', 'real_time_protection.csv'),
+}
 
-# wdavhistory
-if args.Commands == 'wdavhistory':
-    if args.convert:
-        convert_wdavhistory = json2excel.Json2excel('wdavhistory', 'wdavhistory.csv')
-        convert_wdavhistory.json2excel()
+def _run_one(files, jsonl=False):
+    # imported here so --help and bad invocations never pay for the
+    # converter module (and its optional JSON accelerators)
+    import json2excel
+    convert = json2excel.Json2excel(files[0], files[1])
+    if jsonl:
+        convert.convert_jsonl()
     else:
-        parser.print_help(sys.stderr)
+        convert.json2excel()
+
+def main():
+    # in the frozen .exe each spawned worker re-executes this module as
+    # __main__; freeze_support() intercepts that bootstrap before
+    # argparse can choke on the multiprocessing argv
+    import multiprocessing
+    multiprocessing.freeze_support()
+
+    if len(sys.argv) <= 1:
+        sys.argv.append('--help')
+
+    args = parser.parse_args()
+
+    if args.Commands == 'convert-all':
+        # each conversion is CPU-bound on JSON parsing, so spread the
+        # known log files over worker processes instead of running
+        # them back to back
+        from concurrent.futures import ProcessPoolExecutor
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=len(DISPATCH), mp_context=context) as executor:
+            list(executor.map(_run_one, DISPATCH.values()))
+        return
 
-elif args.Commands == 'real-time-protection':
-    if args.convert:
-        convert_wdavhistory = json2excel.Json2excel('real_time_protection.json', 'real_time_protection.csv')
-        convert_wdavhistory.json2excel()
+    # conversion is the default action; --convert is kept as a hidden
+    # no-op for old command lines
+    files = DISPATCH.get(args.Commands)
+    if files:
+        _run_one(files, args.jsonl)
     else:
         parser.print_help(sys.stderr)
 
-else:
-    parser.print_help(sys.stderr)
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,7 @@
 #!/usr/bin/env python
 
 from __future__ import print_function
-import base64, json, getopt, os, sys
-import xml.dom.minidom
+import base64, gzip, json, getopt, os, sys
 
 try:
     import urllib.parse as urllibquote
@@ -11,6 +10,47 @@ except:
     import urllib as urllibquote
     import urllib2 as urllibreq
 
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def pretty_print_xml(payloads):
+    if not isinstance(payloads, bytes):
+        payloads = payloads.encode('utf-8')
+
+    # upstream sometimes returns the payload already indented; printing
+    # it verbatim skips the whole parse+reserialize
+    if payloads.lstrip().startswith(b'<?xml') and b'\n' in payloads:
+        return payloads.decode('utf-8')
+
+    if etree is not None:
+        # libxml2 parses and pretty-prints in C, far faster than the
+        # pure-Python minidom on multi-MB profiles
+        return etree.tostring(etree.fromstring(payloads), pretty_print = True).decode('utf-8')
+
+    try:
+        # C-accelerated ElementTree with indent (Python 3.9+)
+        import xml.etree.ElementTree as ET
+        root = ET.fromstring(payloads)
+        ET.indent(root)
+        return ET.tostring(root, encoding = 'unicode')
+    except AttributeError:
+        # imported lazily: the expat/DOM machinery is only paid for on
+        # interpreters that actually need the legacy path
+        import xml.dom.minidom
+        return xml.dom.minidom.parseString(payloads).toprettyxml()
+
 def usage(err = None):
     if err:
         print(err, file = sys.stderr)
@@ -18,28 +58,64 @@ def usage(err = None):
         
     print ("""Usage: %s --server=url --name=profile --user=username [ --password=password ]
     --server=https://instance.jamfcloud.com    : JAMF server URL
-    --name='Defender onboarding settings'      : macOS Configuration Profile
+    --name='Defender onboarding settings'      : macOS Configuration Profile (may be repeated)
     --user=admin                               : JAMF user name
     --password=12345                           : JAMF password
     --help (or -h): Print out this help page and exit
 
-This tool downloads specified profile from JAMF server to stdout
+This tool downloads specified profile(s) from JAMF server to stdout
 """ % sys.argv[0], file=sys.stderr)
 
+# computed once per (user, password) so repeated profile queries skip
+# the re-encoding (dict cache keeps Python 2 compatibility)
+auth_header_cache = {}
+
+def create_auth_header(user, password):
+    key = (user, password)
+    if key not in auth_header_cache:
+        # join as single-byte strings directly; skips the format-string
+        # round trip while keeping the RFC 7617 latin-1 semantics
+        credentials = base64.b64encode(user.encode('ISO-8859-1') + b':' + password.encode('ISO-8859-1'))
+        auth_header_cache[key] = 'Basic ' + credentials.decode()
+    return auth_header_cache[key]
+
+# one shared opener so TLS sessions can be reused when several
+# profiles are downloaded in one run
+opener = urllibreq.build_opener()
+
 def query_jamf_profile(url, user, password, name):
-    credentials = base64.b64encode('{}:{}'.format(user, password).encode('ISO-8859-1'))
     url = '{}/JSSResource/osxconfigurationprofiles/name/{}'.format(url, urllibquote.quote(name))
 
     req = urllibreq.Request(url)
     req.add_header('Accept', 'application/json')
-    req.add_header('authorization', 'Basic ' + credentials.decode())
-
-    return urllibreq.urlopen(req).read()
+    req.add_header('Accept-Encoding', 'gzip')
+    req.add_header('Connection', 'keep-alive')
+    req.add_header('authorization', create_auth_header(user, password))
+
+    response = opener.open(req)
+    if response.headers.get('Content-Encoding') == 'gzip':
+        # decompress as a stream so extract_payloads can keep parsing
+        # incrementally; multi-MB profiles shrink 3-5x on the wire
+        response = gzip.GzipFile(fileobj = response)
+    return response
+
+def extract_payloads(response):
+    if ijson is not None:
+        # stream-parse just the payloads string out of the response
+        # instead of materializing the whole decoded profile dict
+        return next(ijson.items(response, 'os_x_configuration_profile.general.payloads'))
+
+    content = response.read()
+    if orjson is not None:
+        data = orjson.loads(content)
+    else:
+        data = json.loads(content)
+    return data['os_x_configuration_profile']['general']['payloads']
 
 url = None
 user = None
 password = None
-name = None
+names = []
 
 try:
     opts, args = getopt.getopt(sys.argv[1:], 'hs:u:p:n:', ['help', 'server=', 'user=', 'password=', 'name='])
@@ -55,7 +131,7 @@ try:
             password = v
 
         if k == '-n' or k == '--name':
-            name = v
+            names.append(v)
 
         if k == '-h' or k == '--help':
             usage()
@@ -73,7 +149,7 @@ if not user:
     usage('No user specified')
     exit(1)
 
-if not name:
+if not names:
     usage('No profile name specified')
     exit(1)
 
@@ -81,9 +157,8 @@ if not password:
     import getpass
     password = getpass.getpass('JAMF Password: ')
 
-content = query_jamf_profile(url, user, password, name)
-data = json.loads(content)
-payloads = data['os_x_configuration_profile']['general']['payloads']
-dom = xml.dom.minidom.parseString(payloads)
-print(dom.toprettyxml())
+for name in names:
+    response = query_jamf_profile(url, user, password, name)
+    payloads = extract_payloads(response)
+    print(pretty_print_xml(payloads))
 
@@ -1,7 +1,12 @@
 #!/usr/bin/env python
 
 from __future__ import print_function
-import getopt, os, sys, plistlib, re, shutil, sys, argparse
+import base64, collections, datetime, getopt, os, subprocess, sys, plistlib, re, shutil, sys, argparse, tempfile
+
+try:
+    import lxml.etree as lxml_etree
+except ImportError:
+    lxml_etree = None
 
 if sys.stdout.isatty():
     class tc:
@@ -19,22 +24,41 @@ else:
         grey = ''
         cancel = ''
 
+def _freeze(value):
+    # recursively convert dicts/lists into hashable equivalents so a
+    # payload's content can be hashed once up front
+    if isinstance(value, dict):
+        return frozenset((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
 class Payload():
+    __slots__ = ('payload_type', 'payload', '_key', '_hash', '_payload_hash')
+
     def __init__(self, payload_type, payload):
         self.payload_type = payload_type
         self.payload = payload
 
+    def _finalize(self):
+        # subclasses call this once their id fields are set; hash and
+        # equality become O(1) attribute reads afterwards instead of
+        # rebuilding the id tuple on every dict operation
+        self._key = (self.payload_type,) + self.get_ids()
+        self._hash = hash(self._key)
+        self._payload_hash = hash(_freeze(self.payload))
+
     def get_ids(self):
         assert('Not implemented')
 
     def get_all_ids(self):
-        return (self.payload_type,) + self.get_ids()
+        return self._key
 
     def __hash__(self):
-        return hash(self.get_all_ids())
+        return self._hash
 
     def __eq__(self, other):
-        return self.get_all_ids() == other.get_all_ids()
+        return self._key == other._key
 
     def __ne__(self, other):
         return not(self == other)
@@ -43,10 +67,13 @@ class Payload():
         return self.__str__()
 
 class PayloadSystemPolicyAllFiles(Payload):
+    __slots__ = ('service_type', 'identifier')
+
     def __init__(self, payload_type, service_type, payload):
         Payload.__init__(self, payload_type, payload)
-        self.service_type = service_type
-        self.identifier = payload['Identifier']
+        self.service_type = sys.intern(service_type)
+        self.identifier = sys.intern(payload['Identifier'])
+        self._finalize()
 
     def get_ids(self):
         return (self.identifier, self.service_type)
@@ -55,9 +82,12 @@ class PayloadSystemPolicyAllFiles(Payload):
         return '{}/{} ({})'.format(self.payload_type, self.service_type, self.identifier)
 
 class PayloadKEXT(Payload):
+    __slots__ = ('id',)
+
     def __init__(self, payload_type, id):
         Payload.__init__(self, payload_type, None)
-        self.id = id
+        self.id = sys.intern(id)
+        self._finalize()
 
     def get_ids(self):
         return (self.id,)
@@ -66,10 +96,13 @@ class PayloadKEXT(Payload):
         return '{} ({})'.format(self.payload_type, self.id)
 
 class PayloadSysExt(Payload):
+    __slots__ = ('team_id', 'bunle_id')
+
     def __init__(self, payload_type, team_id, bundle_id):
         Payload.__init__(self, payload_type, None)
-        self.team_id = team_id
-        self.bunle_id = bundle_id
+        self.team_id = sys.intern(team_id)
+        self.bunle_id = sys.intern(bundle_id)
+        self._finalize()
 
     def get_ids(self):
         return (self.team_id, self.bunle_id)
@@ -78,6 +111,8 @@ class PayloadSysExt(Payload):
         return '{} ({}, {})'.format(self.payload_type, self.team_id, self.bunle_id)
 
 class PayloadWebContentFilter(Payload):
+    __slots__ = ('id', 'properties')
+
     def __init__(self, payload_type, payload):
         Payload.__init__(self, payload_type, payload)
         self.id = payload['FilterDataProviderBundleIdentifier']
@@ -86,6 +121,8 @@ class PayloadWebContentFilter(Payload):
         for p in ('FilterDataProviderDesignatedRequirement', 'FilterGrade', 'FilterSockets', 'FilterType', 'PluginBundleID'):
             self.properties[p] = payload[p]
 
+        self._finalize()
+
     def get_ids(self):
         return (self.id,)
 
@@ -93,9 +130,12 @@ class PayloadWebContentFilter(Payload):
         return '{} ({})'.format(self.payload_type, self.id)
 
 class PayloadNotifications(Payload):
+    __slots__ = ('id',)
+
     def __init__(self, payload_type, payload):
         Payload.__init__(self, payload_type, payload)
         self.id = payload['BundleIdentifier']
+        self._finalize()
 
     def get_ids(self):
         return (self.id,)
@@ -104,8 +144,11 @@ class PayloadNotifications(Payload):
         return '{} ({})'.format(self.payload_type, self.id)
 
 class PayloadOnboardingInfo(Payload):
+    __slots__ = ()
+
     def __init__(self, payload_type, payload):
         Payload.__init__(self, payload_type, payload)
+        self._finalize()
 
     def get_ids(self):
         return ()
@@ -125,11 +168,53 @@ def print_error(s):
 def print_debug(s):
     print('{}{}{}'.format(tc.grey, s, tc.cancel))
 
+def _plist_from_element(elem):
+    # walks the lxml element tree of an XML plist into plain Python
+    # containers, mirroring what plistlib.load produces
+    tag = elem.tag
+    if tag == 'dict':
+        result = {}
+        key = None
+        for child in elem:
+            if child.tag == 'key':
+                key = child.text or ''
+            else:
+                result[key] = _plist_from_element(child)
+        return result
+    if tag == 'array':
+        return [_plist_from_element(child) for child in elem]
+    if tag == 'string':
+        return elem.text or ''
+    if tag == 'integer':
+        return int(elem.text)
+    if tag == 'real':
+        return float(elem.text)
+    if tag == 'true':
+        return True
+    if tag == 'false':
+        return False
+    if tag == 'data':
+        return base64.b64decode(elem.text or '')
+    if tag == 'date':
+        return datetime.datetime.strptime(elem.text, '%Y-%m-%dT%H:%M:%SZ')
+    return elem.text
+
 def read_plist(path):
     print_debug('Reading {}'.format(path))
 
-    if 'load' in plistlib.__all__:
+    if lxml_etree is not None:
         with open(path, 'rb') as f:
+            magic = f.read(8)
+        if magic != b'bplist00':
+            # XML plist: let libxml2 do the tokenizing in C instead of
+            # expat driving a pure-Python handler
+            root = lxml_etree.parse(path).getroot()
+            return _plist_from_element(root[0])
+
+    if 'load' in plistlib.__all__:
+        # 1 MiB buffer: multi-MB profile dumps take a handful of read
+        # syscalls instead of hundreds with the default 8 KiB
+        with open(path, 'rb', buffering = 1 << 20) as f:
             return plistlib.load(f)
     else:
         return plistlib.readPlist(path)
@@ -142,67 +227,122 @@ def get_SystemPolicyAllFiles(definition):
                         'Identifier': definition['Identifier'],
                     })
 
+# handlers return plain lists/tuples: most yield 0 or 1 payload, and a
+# materialized sequence skips the generator frame per profile item
+def _handle_tcc(payload_type, content):
+    result = []
+    for service_type, definition_array in content['Services'].items():
+        for definition in definition_array:
+            if service_type == 'SystemPolicyAllFiles':
+                result.append(get_SystemPolicyAllFiles(definition))
+            else:
+                print_warning('Unexpected payload type: {}, {}'.format(payload_type, service_type))
+    return result
+
+def _handle_kext(payload_type, content):
+    return [PayloadKEXT(payload_type, id) for id in content["AllowedTeamIdentifiers"]]
+
+def _handle_sysext(payload_type, content):
+    return [PayloadSysExt(payload_type, team_id, bundle_id)
+            for team_id, bundle_ids in content['AllowedSystemExtensions'].items()
+            for bundle_id in bundle_ids]
+
+def _handle_webfilter(payload_type, content):
+    return (PayloadWebContentFilter(payload_type, {
+        'FilterType': content.get('FilterType'),
+        'PluginBundleID': content.get('PluginBundleID'),
+        'FilterSockets': content.get('FilterSockets'),
+        'FilterDataProviderBundleIdentifier': content.get('FilterDataProviderBundleIdentifier'),
+        'FilterDataProviderDesignatedRequirement': content.get('FilterDataProviderDesignatedRequirement'),
+        'FilterGrade': content.get('FilterGrade'),
+    }),)
+
+def _handle_notifications(payload_type, content):
+    return [PayloadNotifications(payload_type, definition) for definition in content['NotificationSettings']]
+
+def _handle_mcx(payload_type, content):
+    # .get chain: each level is hashed once, instead of a membership
+    # test followed by a second lookup of the same key
+    prefs = content.get('PayloadContentManagedPreferences', {}).get('com.microsoft.wdav.atp')
+    if prefs is not None:
+        try:
+            onboarding_info = prefs['Forced'][0]['mcx_preference_settings']['OnboardingInfo']
+            return (PayloadOnboardingInfo(payload_type, onboarding_info),)
+        except:
+            print_error("Probably malformed onboarding blob")
+    return ()
+
+# one dict lookup per item instead of a cascade of string comparisons
+_PAYLOAD_HANDLERS = {
+    'com.apple.TCC.configuration-profile-policy': _handle_tcc,
+    'com.apple.syspolicy.kernel-extension-policy': _handle_kext,
+    'com.apple.system-extension-policy': _handle_sysext,
+    'com.apple.webcontent-filter': _handle_webfilter,
+    'com.apple.notificationsettings': _handle_notifications,
+    'com.apple.ManagedClient.preferences': _handle_mcx,
+}
+
 def get_payloads(payload_type, content):
-    if payload_type == 'com.apple.TCC.configuration-profile-policy':
-        for service_type, definition_array in content['Services'].items():
-            for definition in definition_array:
-                if service_type == 'SystemPolicyAllFiles':
-                    yield get_SystemPolicyAllFiles(definition)
-                else:
-                    print_warning('Unexpected payload type: {}, {}'.format(payload_type, service_type))
-    elif payload_type == 'com.apple.syspolicy.kernel-extension-policy':
-        for id in content["AllowedTeamIdentifiers"]:
-            yield PayloadKEXT(payload_type, id)
-    elif payload_type == 'com.apple.system-extension-policy':
-        for team_id, bundle_ids in content['AllowedSystemExtensions'].items():
-            for bundle_id in bundle_ids:
-                yield PayloadSysExt(payload_type, team_id, bundle_id)
-    elif payload_type == 'com.apple.webcontent-filter':
-        yield PayloadWebContentFilter(payload_type, {
-            'FilterType': content.get('FilterType'),
-            'PluginBundleID': content.get('PluginBundleID'),
-            'FilterSockets': content.get('FilterSockets'),
-            'FilterDataProviderBundleIdentifier': content.get('FilterDataProviderBundleIdentifier'),
-            'FilterDataProviderDesignatedRequirement': content.get('FilterDataProviderDesignatedRequirement'),
-            'FilterGrade': content.get('FilterGrade'),
-        })
-    elif payload_type == 'com.apple.notificationsettings':
-        for definition in content['NotificationSettings']:
-            yield PayloadNotifications(payload_type, definition)
-    elif payload_type == 'com.apple.ManagedClient.preferences':
-        if 'PayloadContentManagedPreferences' in content and 'com.microsoft.wdav.atp' in content['PayloadContentManagedPreferences']:
-            try:
-                onboarding_info = content['PayloadContentManagedPreferences']['com.microsoft.wdav.atp']['Forced'][0]['mcx_preference_settings']['OnboardingInfo']
-                yield PayloadOnboardingInfo(payload_type, onboarding_info)
-            except:
-                print_error("Probably malformed onboarding blob")
+    # the same payload types repeat across every profile item; interning
+    # dedupes the parser's fresh str objects and turns the cached-key
+    # comparisons into pointer checks
+    payload_type = sys.intern(payload_type)
+    handler = _PAYLOAD_HANDLERS.get(payload_type)
+    return handler(payload_type, content) if handler else ()
+
+def _iter_profiles_streaming(path):
+    # incremental (level, profile) walk of an XML profiles dump: each
+    # profile <dict> is materialized alone and freed once consumed, so
+    # peak memory is one profile instead of the whole plist
+    print_debug('Reading {}'.format(path))
+    depth = 0
+    level = None
+
+    for event, elem in lxml_etree.iterparse(path, events = ('start', 'end')):
+        if event == 'start':
+            depth += 1
+            continue
+
+        depth -= 1
+        if depth == 2 and elem.tag == 'key':
+            # plist > dict > key: name of the profile level
+            level = elem.text or ''
+        elif depth == 3 and elem.tag == 'dict':
+            # plist > dict > array > dict: one complete profile
+            yield level, _plist_from_element(elem)
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+
+def _iter_profiles(path):
+    if lxml_etree is not None:
+        with open(path, 'rb') as f:
+            magic = f.read(8)
+        if magic != b'bplist00':
+            return _iter_profiles_streaming(path)
 
-def parse_profiles(path):
-    result = {}
     plist = read_plist(path)
+    return ((level, profile) for level, profiles in plist.items() for profile in profiles)
 
-    for level, profiles in plist.items():
-        for profile in profiles:
+def parse_profiles(path):
+    # defaultdict: one hash per payload instead of lookup + re-store
+    result = collections.defaultdict(list)
 
-            for item in profile['ProfileItems']:
-                payload_type = item['PayloadType']
-                content = item['PayloadContent']
+    for level, profile in _iter_profiles(path):
+        level = sys.intern(level)
 
-                for payload in get_payloads(payload_type, content):
-                    if payload in result:
-                        result_payloads = result[payload]
-                    else:
-                        result_payloads = []
-
-                    result_payloads.append({
-                        'payload': payload,
-                        'path': path,
-                        'level': level,
-                        'name': profile['ProfileDisplayName'],
-                        'time': profile['ProfileInstallDate']
-                    })
+        for item in profile['ProfileItems']:
+            payload_type = item['PayloadType']
+            content = item['PayloadContent']
 
-                    result[payload] = result_payloads
+            for payload in get_payloads(payload_type, content):
+                result[payload].append({
+                    'payload': payload,
+                    'path': path,
+                    'level': level,
+                    'name': profile['ProfileDisplayName'],
+                    'time': profile['ProfileInstallDate']
+                })
 
     return result
 
@@ -222,12 +362,35 @@ def parse_expected(path):
 
 def parse_tcc(path):
     result = {}
-    mdm_tcc = '/tmp/MDMOverrides.plist'
 
     try:
-        shutil.copy(path, mdm_tcc)
-        os.system('plutil -convert xml1 "{}"'.format(mdm_tcc))
-        tcc = read_plist(mdm_tcc)
+        with open(path, 'rb') as f:
+            magic = f.read(8)
+
+        if magic == b'bplist00':
+            # binary plist: convert a private copy with plutil; a
+            # unique temp name avoids symlink races on a fixed /tmp
+            # path and lets concurrent runs coexist
+            fd, mdm_tcc = tempfile.mkstemp(suffix = '.plist')
+            os.close(fd)
+            try:
+                # copyfile skips the chmod that shutil.copy would do
+                shutil.copyfile(path, mdm_tcc)
+                try:
+                    subprocess.run(['plutil', '-convert', 'xml1', mdm_tcc])
+                except FileNotFoundError:
+                    # no plutil on this machine - e.g. an exported
+                    # overrides file analyzed off-box; plistlib reads
+                    # binary plists natively, so parse the original
+                    tcc = read_plist(path)
+                else:
+                    tcc = read_plist(mdm_tcc)
+            finally:
+                os.unlink(mdm_tcc)
+        else:
+            # already XML: parse in place, skipping the copy and the
+            # plutil fork entirely
+            tcc = read_plist(path)
     except IOError:
         tcc = None
         print_warning('No {} found, is the machine enrolled into MDM?'.format(path))
@@ -237,16 +400,20 @@ def parse_tcc(path):
             if 'kTCCServiceSystemPolicyAllFiles' in service:
                 definition = service['kTCCServiceSystemPolicyAllFiles']
                 d = get_SystemPolicyAllFiles(definition)
-                definition['CodeRequirementData']
-                result[d] = {
-                    'CodeRequirement': definition['CodeRequirement'],
-                    'IdentifierType': definition['IdentifierType'],
-                    'Identifier': definition['Identifier'],
-                    'Allowed': definition['Allowed'],
-                }
+                # the payload dict built above already holds exactly the
+                # four keys the report compares; reuse it instead of
+                # allocating a second dict per TCC entry
+                result[d] = d.payload
 
     return result
 
+def _payloads_match(a, b):
+    # hash-then-compare: differing cached hashes rule out a match
+    # without walking the payload dicts
+    if a._payload_hash != b._payload_hash:
+        return False
+    return a.payload == b.payload
+
 def format_location(profile_data):
     return '{}, profile: "{}", deployed: {}'.format(profile_data['path'], profile_data['name'], profile_data['time'])
 
@@ -256,9 +423,10 @@ def report(path_profiles, path_expected, path_tcc):
     tcc = parse_tcc(path_tcc)
 
     for expected in list_expected:
-        if expected in map_profiles:
-            m = map_profiles[expected]
-
+        # single .get instead of membership test + lookup: one hash/eq
+        # round per expected payload
+        m = map_profiles.get(expected)
+        if m:
             t = None
             check_tcc = False
 
@@ -269,7 +437,7 @@ def report(path_profiles, path_expected, path_tcc):
                 check_tcc = True
 
             if len(m) == 1:
-                if expected.payload == m[0]['payload'].payload:
+                if _payloads_match(expected, m[0]['payload']):
                     if not check_tcc or t == m[0]['payload'].payload:
                         print_success("Found {} in {}".format(expected, format_location(m[0])))
                     else:
@@ -282,7 +450,7 @@ def report(path_profiles, path_expected, path_tcc):
 
                 n=1
                 for d in m:
-                    if expected.payload == d['payload'].payload:
+                    if _payloads_match(expected, d['payload']):
                         match_label = '{}[Match]{}'.format(tc.green, tc.cancel)
                     else:
                         match_label = '{}[Mismatch]{}'.format(tc.red, tc.cancel)
@@ -347,7 +515,8 @@ in_file = getattr(args, 'in')
 if not in_file:
     in_file = '/tmp/profiles.xml'
     print_debug('Running "profiles" command, sudo password may be required...')
-    os.system('sudo profiles show -output "{}"'.format(in_file))
+    # argv list skips the /bin/sh fork and sidesteps quoting of the path
+    subprocess.run(['sudo', 'profiles', 'show', '-output', in_file], check = False)
 
 in_file = os.path.abspath(os.path.expanduser(in_file))
 